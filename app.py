@@ -1,8 +1,17 @@
 import streamlit as st
 import pandas as pd
-import json
+import atexit
+import hashlib
+import io
+import math
+import orjson
 import os
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
 from datetime import datetime
+from operator import itemgetter
 import plotly.express as px
 
 # Set page configuration
@@ -13,187 +22,382 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for a polished light theme
-st.markdown("""
-<style>
-    /* Force light theme for all elements */
-    .stApp {
-        background: linear-gradient(135deg, #e6f0fa 0%, #f7f9fc 100%) !important;
-        color: #2c3e50 !important;
-    }
-    
-    /* Sidebar */
-    .css-1d391kg {
-        background: #f7f9fc !important;
-        color: #2c3e50 !important;
-    }
-    
-    /* Card styling for books */
-    .book-card {
-        background: #ffffff;
-        border-radius: 12px;
-        padding: 20px;
-        margin: 15px 0;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-        transition: transform 0.3s ease, box-shadow 0.3s ease;
-    }
-    .book-card:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 6px 18px rgba(0,0,0,0.15);
-    }
-    
-    /* Buttons */
-    .stButton>button {
-        background: #1e90ff !important;
-        color: white !important;
-        border-radius: 8px !important;
-        border: none !important;
-        padding: 10px 20px !important;
-        font-weight: 500 !important;
-        transition: background 0.3s ease !important;
-    }
-    .stButton>button:hover {
-        background: #187bcd !important;
-    }
-    
-    /* Input fields */
-    .stTextInput>div>input, .stNumberInput>div>input, .stTextArea>div>textarea {
-        background: #f9f9f9 !important;
-        border: 1px solid #d1d9e6 !important;
-        border-radius: 8px !important;
-        padding: 10px !important;
-        color: #2c3e50 !important;
-    }
-    
-    /* Selectboxes and Multiselects */
-    .stSelectbox>div, .stMultiSelect>div {
-        background: #f9f9f9 !important;
-        border: 1px solid #d1d9e6 !important;
-        border-radius: 8px !important;
-        color: #2c3e50 !important;
-    }
-    
-    /* Sliders */
-    .stSlider>div>div {
-        background: #1e90ff !important;
-    }
-    
-    /* Tabs */
-    .stTabs [role="tablist"] {
-        background: #f7f9fc !important;
-        border-bottom: 2px solid #d1d9e6 !important;
-    }
-    .stTabs [role="tab"] {
-        color: #2c3e50 !important;
-        font-weight: 500 !important;
-        padding: 10px 20px !important;
-        transition: color 0.3s ease !important;
-    }
-    .stTabs [role="tab"][aria-selected="true"] {
-        color: #1e90ff !important;
-        border-bottom: 2px solid #1e90ff !important;
-    }
-    .stTabs [role="tab"]:hover {
-        color: #1e90ff !important;
-    }
-    
-    /* Headers */
-    h1, h2, h3 {
-        color: #2c3e50 !important;
-        font-family: 'Arial', sans-serif !important;
-    }
-    
-    /* Checkbox and Radio */
-    .stCheckbox label, .stRadio label {
-        color: #2c3e50 !important;
-    }
-    
-    /* File Uploader */
-    .stFileUploader>div {
-        background: #f9f9f9 !important;
-        border: 1px solid #d1d9e6 !important;
-        border-radius: 8px !important;
-    }
-    
-    /* Success/Info messages */
-    .stAlert {
-        background: #e6f0fa !important;
-        color: #2c3e50 !important;
-        border-radius: 8px !important;
-    }
-    
-    /* Welcome message */
-    @keyframes fadeIn {
-        0% { opacity: 0; }
-        100% { opacity: 1; }
-    }
-    .welcome-message {
-        animation: fadeIn 2s ease-in-out;
-        font-size: 2.5em;
-        font-weight: bold;
-        color: #1e90ff !important;
-        text-align: center;
+# Custom CSS for a polished light theme, read from styles.css once per server process
+@st.cache_resource
+def load_css():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "styles.css"), encoding="utf-8") as file:
+        return f"<style>\n{file.read()}</style>"
+
+st.markdown(load_css(), unsafe_allow_html=True)
+
+# File paths for saving/loading library data
+LIBRARY_SNAPSHOT = "library.json"
+LIBRARY_LOG = "library.jsonl"
+COVERS_DIR = "covers/"
+
+# Version of the snapshot layout; older snapshots are migrated on load
+LIBRARY_SCHEMA = 3
+
+# Genres offered when adding or editing a book
+GENRES = ("Fiction", "Action", "Adventure", "Comedy", "Horror", "Non-Fiction", "Sci-Fi", "Fantasy", "Mystery", "Thriller",
+          "Romance", "Biography", "History", "Science", "Self-Help", "Other")
+
+# Function to apply a single logged change to the books, keyed by their ids in library order.
+# Every session appends to the same log, so changes name a book by its id rather than its position;
+# a change to a book another session already removed is skipped.
+def apply_event(books, event):
+    if event["op"] == "add":
+        books[event["book"]["id"]] = event["book"]
+    elif event["op"] == "edit":
+        if event["id"] in books:
+            books[event["id"]].update(event["book"])
+    elif event["op"] == "remove":
+        books.pop(event["id"], None)
+
+# Function to cache the lowercase forms searches compare against on the book itself
+def add_search_keys(book):
+    book["_title_lc"] = book["title"].lower()
+    book["_author_lc"] = book["author"].lower()
+
+# Function to get a book without its in-memory "_" fields, as it is saved and exported
+def stored(book):
+    return {key: value for key, value in book.items() if not key.startswith("_")}
+
+# Function to atomically write the whole library as the snapshot file
+def write_snapshot(library):
+    temp_file = LIBRARY_SNAPSHOT + ".tmp"
+    # Compact output through one large buffer; pretty-printing is left to the JSON export
+    with open(temp_file, 'wb', buffering=0) as raw, io.BufferedWriter(raw, buffer_size=1 << 20) as file:
+        file.write(orjson.dumps({"schema": LIBRARY_SCHEMA, "books": [stored(book) for book in library]}))
+        sync_file(file)  # The data must be on disk before the rename can make it the snapshot
+    os.replace(temp_file, LIBRARY_SNAPSHOT)  # Atomic, so an interrupted write never leaves a half-written snapshot
+    sync_dir(os.path.dirname(os.path.abspath(LIBRARY_SNAPSHOT)))  # Persist the rename before the log is emptied
+    load_snapshot.clear()
+
+# Function to cut a torn last line, left by an interrupted write, off the end of the library log
+def repair_log():
+    if not os.path.exists(LIBRARY_LOG):
+        return
+    with open(LIBRARY_LOG, 'rb+') as file:
+        end = pos = file.seek(0, os.SEEK_END)
+        # Scan back from the end in blocks for the last complete line
+        while pos > 0:
+            start = max(0, pos - (1 << 16))
+            file.seek(start)
+            newline = file.read(pos - start).rfind(b"\n")
+            if newline != -1:
+                pos = start + newline + 1
+                break
+            pos = start
+        if pos < end:
+            file.truncate(pos)
+
+# Function to get the holder of the library log's append handle, shared by all sessions
+@st.cache_resource
+def log_handle():
+    return {"file": None}
+
+# Function to get the append handle of the library log, opened on the first change so loads never create it
+def library_log():
+    handle = log_handle()
+    with log_lock():
+        if handle["file"] is None:
+            # A torn last line is cut off first, so the next entry is not appended onto it and lost with it
+            repair_log()
+            # Append mode keeps writes at the end of the file even after compaction truncates it
+            handle["file"] = open(LIBRARY_LOG, 'ab', buffering=1 << 16)
+            atexit.register(handle["file"].close)
+        return handle["file"]
+
+# Function to push a file's buffered writes to disk
+def sync_file(file):
+    file.flush()
+    os.fsync(file.fileno())
+
+# Function to persist changes to a directory's entries, such as a rename into it
+def sync_dir(path):
+    if os.name == "nt":
+        return  # Directories cannot be opened for fsync on Windows
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# Function to get the lock that appends to the log and compaction of it take, shared by all sessions
+@st.cache_resource
+def log_lock():
+    return threading.RLock()
+
+# Function to push buffered log entries to disk, if any session has written some
+def flush_log():
+    log_file = log_handle()["file"]
+    if log_file is not None:
+        sync_file(log_file)
+
+# Function to get the state of the pending trailing flush, shared by all sessions like the log handle
+@st.cache_resource
+def flush_timer():
+    return {"lock": threading.Lock(), "timer": None}
+
+# Function run by the flush timer
+def flush_pending(state, log_file):
+    with state["lock"]:
+        state["timer"] = None  # Entries written from here on arm a new timer
+    try:
+        sync_file(log_file)
+    except ValueError:
+        pass  # The handle was closed at exit, which flushed it already
+
+# Function to make sure buffered log entries reach disk shortly after a change, even if no session reruns
+def schedule_flush(delay=2.0):
+    state = flush_timer()
+    with state["lock"]:
+        if state["timer"] is None:
+            state["timer"] = threading.Timer(delay, flush_pending, args=(state, library_log()))
+            state["timer"].daemon = True
+            state["timer"].start()
+
+# Function to bring books saved by older versions up to the current schema
+def migrate_books(library):
+    for book in library:
+        # Ensure all books have the "genres" key
+        genres = book.setdefault("genres", [])
+        # Convert "Science Fiction" to "Sci-Fi" for consistency, only rebuilding lists that need it
+        if "Science Fiction" in genres:
+            book["genres"] = ["Sci-Fi" if genre == "Science Fiction" else genre for genre in genres]
+        # Give every book the stable id that logged changes refer to
+        book.setdefault("id", uuid.uuid4().hex)
+
+# Function to parse the snapshot file, cached until the file is modified
+@st.cache_resource(max_entries=1)
+def load_snapshot(path, mtime_ns):
+    with open(path, 'rb') as file:
+        return orjson.loads(file.read())
+
+# Function to read the snapshot and replay the change log on top of it
+def read_library():
+    flush_log()  # Entries still buffered by any session belong to the library being read
+    library = []
+    if os.path.exists(LIBRARY_SNAPSHOT):
+        snapshot = load_snapshot(LIBRARY_SNAPSHOT, os.stat(LIBRARY_SNAPSHOT).st_mtime_ns)
+        # Snapshots written before the schema key are a bare list of books
+        if isinstance(snapshot, list):
+            snapshot = {"schema": 1, "books": snapshot}
+        # The parsed snapshot is shared through the cache, so each load gets its own book dicts
+        library = list(map(dict, snapshot["books"]))
+        if snapshot["schema"] < LIBRARY_SCHEMA:
+            migrate_books(library)
+            try:
+                write_snapshot(library)  # Later loads skip the migration
+            except OSError:
+                pass  # Read-only storage; the migration simply runs again next time
+    if os.path.exists(LIBRARY_LOG):
+        books = {book["id"]: book for book in library}
+        with open(LIBRARY_LOG, 'rb') as file:
+            for line in file:
+                try:
+                    event = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # Skip a line that cannot be decoded instead of dropping everything after it
+                apply_event(books, event)
+        library = list(books.values())
+    for book in library:
+        add_search_keys(book)
+    return library
+
+# Function to get the keys a book is filed under in each inverted index:
+# lowercase title/author words and whole genres as spelled. The genre index doubles as a sparse
+# book-by-genre one-hot matrix: each genre's postings are the rows set in its column.
+def index_keys(book):
+    return {
+        "title": set(book["_title_lc"].split()),
+        "author": set(book["_author_lc"].split()),
+        "genre": set(book["genres"])
     }
-</style>
-""", unsafe_allow_html=True)
 
-# File path for saving/loading library data
-LIBRARY_FILE = "library.json"
+# Function to file a book under its keys in the inverted indices
+def index_book(i, book):
+    for field, keys in index_keys(book).items():
+        for key in keys:
+            st.session_state.indices[field][key].add(i)
+
+# Function to take a book out of the inverted indices
+def unindex_book(i, book):
+    for field, keys in index_keys(book).items():
+        postings = st.session_state.indices[field]
+        for key in keys:
+            postings[key].discard(i)
+            if not postings[key]:
+                del postings[key]
+
+# Function to map each title to its first index, matching what list.index() would return
+def first_title_indices(library):
+    title_to_index = {}
+    for i, book in enumerate(library):
+        title_to_index.setdefault(book["title"], i)
+    return title_to_index
+
+# Function to rebuild the lookup structures derived from the library after it changes
+def refresh_library_views(reindex=True):
+    library = st.session_state.library
+    
+    # Single-book changes update the inverted indices and title map in place instead
+    if reindex:
+        st.session_state.indices = {"title": defaultdict(set), "author": defaultdict(set), "genre": defaultdict(set)}
+        for i, book in enumerate(library):
+            index_book(i, book)
+        st.session_state.title_to_index = first_title_indices(library)
+    
+    # Filter and search results are stale once the library changes
+    st.session_state.filter_cache = None
+    st.session_state.search_cache = None
+    st.session_state.library_version += 1
+
+# Function to get the library as a DataFrame, built on first use after each change
+def library_frame():
+    if st.session_state.library_df is None or st.session_state.library_df[0] != st.session_state.library_version:
+        library = st.session_state.library
+        df = pd.DataFrame({
+            "rating": [book.get("rating", 0) for book in library],
+            "read_status": [book["read_status"] for book in library],
+        }, dtype=object).astype({"rating": "int64", "read_status": "bool"})
+        st.session_state.library_df = (st.session_state.library_version, df)
+    return st.session_state.library_df[1]
+
+# Function to get a cache key for the current contents of this session's library
+def library_key():
+    return (st.session_state.session_id, st.session_state.library_version)
+
+# Function to list the book titles in library order, cached per library version
+@st.cache_data(max_entries=32)
+def library_titles(key, _library):
+    return [book["title"] for book in _library]
+
+# Function to load the saved library into this session, used at startup and by the Settings tab
+def load_library():
+    try:
+        st.session_state.library = read_library()
+        st.success(f"Library loaded successfully from {LIBRARY_SNAPSHOT}")
+    except Exception as e:
+        st.error(f"Error loading library: {e}")
+    refresh_library_views()
 
 # Initialize session state to store the library if it doesn't exist
 if 'library' not in st.session_state:
     st.session_state.library = []
+    # The session id keeps cache entries of concurrent sessions apart
+    st.session_state.session_id = uuid.uuid4().hex
+    st.session_state.library_version = 0
+    st.session_state.library_df = None
+    st.session_state.dirty = False
+    st.session_state.last_save = 0
     
     # Load library from file if it exists
-    if os.path.exists(LIBRARY_FILE):
-        try:
-            with open(LIBRARY_FILE, 'r') as file:
-                st.session_state.library = json.load(file)
-            
-            # Migration step: Ensure all books have the "genres" key
-            for book in st.session_state.library:
-                if "genres" not in book:
-                    book["genres"] = []  # Add "genres" key with an empty list as the default value
-                # Convert "Science Fiction" to "Sci-Fi" for consistency
-                book["genres"] = ["Sci-Fi" if genre == "Science Fiction" else genre for genre in book["genres"]]
-            
-            st.success(f"Library loaded successfully from {LIBRARY_FILE}")
-        except Exception as e:
-            st.error(f"Error loading library: {e}")
+    if os.path.exists(LIBRARY_SNAPSHOT) or os.path.exists(LIBRARY_LOG):
+        load_library()
+    else:
+        refresh_library_views()
+
+# Function to write the whole library as a snapshot and empty the change log
+def compact_library(force=False):
+    try:
+        with log_lock():
+            if not force:
+                snapshot_size = os.path.getsize(LIBRARY_SNAPSHOT) if os.path.exists(LIBRARY_SNAPSHOT) else 0
+                if os.path.getsize(LIBRARY_LOG) <= 2 * snapshot_size:
+                    return
+            # The log holds the changes of every session, so the snapshot is built from what is on disk
+            # rather than from this session's copy; the lock keeps appends out until the log is emptied
+            write_snapshot(read_library())
+            open(LIBRARY_LOG, 'w').close()
+        st.success(f"Library saved successfully to {LIBRARY_SNAPSHOT}")
+    except Exception as e:
+        st.error(f"Error saving library: {e}")
+
+# Function to append a single change to the library log
+def append_event(op, payload):
+    try:
+        event = {"op": op, **payload}
+        # Lands in the handle's buffer, which the timer flushes to disk within a couple of seconds
+        with log_lock():
+            library_log().write(orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE))
+        schedule_flush()
+        st.session_state.dirty = True
+    except Exception as e:
+        st.error(f"Error saving library: {e}")
 
-# Function to save library to file
-def save_library():
+# Function to check at most once per interval whether the log has grown enough to compact
+def maybe_save(min_interval=2.0):
+    if not st.session_state.dirty or time.time() - st.session_state.last_save <= min_interval:
+        return
     try:
-        with open(LIBRARY_FILE, 'w') as file:
-            json.dump(st.session_state.library, file, indent=4)
-        st.success(f"Library saved successfully to {LIBRARY_FILE}")
+        flush_log()
     except Exception as e:
         st.error(f"Error saving library: {e}")
+        return
+    st.session_state.dirty = False
+    st.session_state.last_save = time.time()
+    compact_library()
+
+# Function to get the on-disk path of a stored cover
+def cover_path(cover):
+    return os.path.join(COVERS_DIR, cover)
+
+# Function to read a cover's bytes, kept in memory since a content-addressed file never changes
+@st.cache_resource(max_entries=100)
+def cover_bytes(cover):
+    with open(cover_path(cover), 'rb') as file:
+        return file.read()
+
+# Function to store an uploaded cover once, named by its hash, and return that file name
+def persist_cover(file):
+    if file is None:
+        return None
+    data = file.getbuffer()  # A view of the upload rather than a copy of its bytes
+    # The upload's extension is kept so the image is served with the right MIME type
+    cover = hashlib.blake2b(data, digest_size=16).hexdigest() + os.path.splitext(file.name)[1].lower()
+    path = cover_path(cover)
+    if not os.path.exists(path):  # Identical covers are only written once
+        os.makedirs(COVERS_DIR, exist_ok=True)
+        # Written under a temporary name and renamed into place, so an interrupted write never
+        # leaves a truncated file that later uploads of the same image would be trusted to match
+        temp_file = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_file, 'wb') as out:
+            out.write(data)
+            sync_file(out)
+        os.replace(temp_file, path)
+    return cover
 
 # Function to add a book
 def add_book(title, author, publication_year, genres, read_status, cover_image=None, rating=0, review=""):
     # Create book dictionary
     book = {
+        "id": uuid.uuid4().hex,
         "title": title,
         "author": author,
         "publication_year": publication_year,
         "genres": genres,
         "read_status": read_status,
         "date_added": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "cover_image": cover_image.read() if cover_image else None,
+        "cover_image": persist_cover(cover_image),  # Only the file name is kept, never the image bytes
         "rating": rating,
         "review": review
     }
     
     # Add book to library
+    add_search_keys(book)
     st.session_state.library.append(book)
-    save_library()
+    index_book(len(st.session_state.library) - 1, book)
+    st.session_state.title_to_index.setdefault(title, len(st.session_state.library) - 1)
+    refresh_library_views(reindex=False)
+    append_event("add", {"book": stored(book)})
     return True
 
 # Function to edit a book
 def edit_book(index, title, author, publication_year, genres, read_status, cover_image=None, rating=0, review=""):
-    new_cover = cover_image.read() if cover_image else st.session_state.library[index]["cover_image"]
-    st.session_state.library[index].update({
+    new_cover = persist_cover(cover_image) or st.session_state.library[index]["cover_image"]
+    changes = {
         "title": title,
         "author": author,
         "publication_year": publication_year,
@@ -202,50 +406,119 @@ def edit_book(index, title, author, publication_year, genres, read_status, cover
         "cover_image": new_cover,
         "rating": rating,
         "review": review
-    })
-    save_library()
+    }
+    renamed = st.session_state.library[index]["title"] != title
+    unindex_book(index, st.session_state.library[index])
+    st.session_state.library[index].update(changes)
+    add_search_keys(st.session_state.library[index])
+    index_book(index, st.session_state.library[index])
+    if renamed:
+        # Another book may share the old title, so the first index of each title is looked up again
+        st.session_state.title_to_index = first_title_indices(st.session_state.library)
+    refresh_library_views(reindex=False)
+    append_event("edit", {"id": st.session_state.library[index]["id"], "book": changes})
     return True
 
 # Function to remove a book
-def remove_book(title):
-    initial_length = len(st.session_state.library)
-    st.session_state.library = [book for book in st.session_state.library if book["title"].lower() != title.lower()]
-    
-    if len(st.session_state.library) < initial_length:
-        save_library()
-        return True
-    return False
+def remove_book(index):
+    book = st.session_state.library.pop(index)
+    refresh_library_views()  # Every later book shifts down one index, so the indices are rebuilt
+    append_event("remove", {"id": book["id"]})
+    return True
+
+# Function to build the table for CSV and Excel exports, pointing at cover files instead of embedding them
+def export_frame(books):
+    df = pd.DataFrame(books).drop(columns=["cover_image"], errors="ignore")
+    df["cover_path"] = [cover_path(book["cover_image"]) if book.get("cover_image") else None for book in books]
+    return df
+
+# Function to display a single book with its cover and review
+def show_book_card(book):
+    with st.container():
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            image = "https://via.placeholder.com/100x150?text=No+Cover"
+            if book.get("cover_image"):
+                try:
+                    image = cover_bytes(book["cover_image"])
+                except OSError:
+                    pass  # The cover file is missing, e.g. library.json was copied without covers/
+            st.image(image, width=100)
+        with col2:
+            st.subheader(book["title"])
+            st.markdown(f"**Author:** {book['author']}")
+            st.markdown(f"**Year:** {book['publication_year']}")
+            st.markdown(f"**Genres:** {', '.join(book['genres'])}")
+            st.markdown(f"**Status:** {'✅ Read' if book['read_status'] else '📖 Unread'}")
+            st.markdown(f"**Rating:** {'⭐' * book.get('rating', 0)}")
+            st.markdown(f"**Review:** {book.get('review', 'No review yet.')}")
+            st.markdown(f"**Date Added:** {book['date_added']}")
+        st.markdown("---")
+
+# Function to find the books whose indexed key contains the given text
+def books_with_key_containing(index, text):
+    hits = set()
+    for key, book_indices in index.items():
+        if text in key:
+            hits |= book_indices
+    return hits
 
 # Function to search for books
 def search_books(query, search_by):
-    results = []
+    library = st.session_state.library
     query = query.lower()
+    if not query.split():
+        return []  # An empty or whitespace-only query has no words to look up
     
-    for book in st.session_state.library:
-        if search_by == "title" and query in book["title"].lower():
-            results.append(book)
-        elif search_by == "author" and query in book["author"].lower():
-            results.append(book)
-        elif search_by == "genre" and any(query in genre.lower() for genre in book["genres"]):
-            results.append(book)
+    # Reruns triggered by other widgets repeat the last search, so it is remembered until the library changes
+    if st.session_state.search_cache and st.session_state.search_cache[0] == (query, search_by):
+        return [library[i] for i in st.session_state.search_cache[1]]
     
-    return results
+    index = st.session_state.indices[search_by]
+    if search_by == "genre":
+        # Genres are indexed whole, so comparing against the few distinct genres is the full search
+        matches = sorted(set().union(*(books for genre, books in index.items() if query in genre.lower())))
+    else:
+        # Each word of the query lies inside one indexed word of any matching book, so intersecting the
+        # books found per word gives every match plus a few false positives, which are then checked
+        candidates = None
+        for word in set(query.split()):
+            word_hits = books_with_key_containing(index, word)
+            candidates = word_hits if candidates is None else candidates & word_hits
+            if not candidates:
+                break
+        field = "_title_lc" if search_by == "title" else "_author_lc"
+        matches = [i for i in sorted(candidates) if query in library[i][field]]
+    
+    st.session_state.search_cache = ((query, search_by), matches)
+    return [library[i] for i in matches]
 
-# Function to get library statistics
-def get_statistics():
-    total_books = len(st.session_state.library)
-    read_books = sum(1 for book in st.session_state.library if book["read_status"])
-    
+# Function to get library statistics with the genre and year distributions, cached per library version
+@st.cache_data(max_entries=32)
+def get_statistics(key, _library, _genre_index, _frame):
+    # The read count is a single reduction over the frame's bool column
+    read_books = int(_frame["read_status"].sum())
+    # Column sums of the genre one-hot matrix are just the sizes of the genre postings
+    genre_counts = {genre: len(books) for genre, books in _genre_index.items()}
+    # itemgetter feeds Counter() directly, so the year count runs without a Python-level loop
+    year_counts = Counter(map(itemgetter("publication_year"), _library))
+    
+    total_books = len(_library)
     if total_books > 0:
         percentage_read = (read_books / total_books) * 100
     else:
         percentage_read = 0
-        
-    return {
+    
+    stats = {
         "total_books": total_books,
         "read_books": read_books,
         "percentage_read": percentage_read
     }
+    genre_df = pd.DataFrame(list(genre_counts.items()), columns=['Genre', 'Count'])
+    # Sorting the (year, count) pairs directly is cheaper than sorting the frame afterwards
+    years, counts = zip(*sorted(year_counts.items())) if year_counts else ((), ())
+    year_df = pd.DataFrame({'Year': years, 'Count': counts})
+    return stats, genre_df, year_df
 
 # Welcome message with animation
 st.markdown("""
@@ -254,25 +527,39 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Static sidebar content
+SIDEBAR_INTRO = """
+Welcome to your personal library! Manage your book collection with ease.
+
+---
+### Quick Actions
+"""
+SIDEBAR_FOOTER = """
+---
+### Social Media Links
+[GitHub](https://github.com/M-TalalSid)
+
+[LinkedIn](https://www.linkedin.com/in/m-talal-shoaib-8b40322b5/)
+
+---
+### App Info
+Built using Streamlit
+
+Version 1.2.0
+
+Made by Talal Shoaib
+"""
+
 # Sidebar for additional options
 with st.sidebar:
     st.header("📚 Library Manager")
-    st.markdown("Welcome to your personal library! Manage your book collection with ease.")
-    st.markdown("---")
-    st.markdown("### Quick Actions")
+    # Static text is grouped into single markdown elements to keep the per-rerun element count down
+    st.markdown(SIDEBAR_INTRO)
     if st.button("📥 Export Library"):
         st.session_state.export_library = True
     if st.button("🔄 Refresh Library"):
         st.rerun()
-    st.markdown("---")
-    st.markdown("### Social Media Links")
-    st.markdown("[GitHub](https://github.com/M-TalalSid)")
-    st.markdown("[LinkedIn](https://www.linkedin.com/in/m-talal-shoaib-8b40322b5/)")
-    st.markdown("---")
-    st.markdown("### App Info")
-    st.markdown("Built using Streamlit")
-    st.markdown("Version 1.2.0")
-    st.markdown("Made by Talal Shoaib")
+    st.markdown(SIDEBAR_FOOTER)
 
 # Main application header
 st.title("📚 Personal Library Manager")
@@ -302,8 +589,7 @@ with tab1:
         with col2:
             genres = st.multiselect(
                 "Genre", 
-                ["Fiction", "Action", "Adventure", "Comedy", "Horror", "Non-Fiction", "Sci-Fi", "Fantasy", "Mystery", "Thriller", 
-                 "Romance", "Biography", "History", "Science", "Self-Help", "Other"]
+                GENRES
             )
             read_status = st.checkbox("Have you read this book?")
             rating = st.slider("Rate this book (1-5 stars)", 1, 5, value=3)
@@ -320,6 +606,8 @@ with tab1:
                 st.success(f"'{title}' by {author} added successfully!")
         else:
             st.error("Title, Author, and at least one Genre are required fields.")
+    
+    maybe_save()
 
 # Tab 2: View Library
 with tab2:
@@ -329,45 +617,62 @@ with tab2:
         st.info("Your library is empty. Add some books to get started!")
     else:
         # Add filters
-        filter_genre = st.selectbox("Filter by Genre", ["All"] + sorted(set(genre for book in st.session_state.library for genre in book["genres"])))
+        filter_genre = st.selectbox("Filter by Genre", ["All"] + sorted(st.session_state.indices["genre"]))
         filter_status = st.selectbox("Filter by Status", ["All", "Read", "Unread"])
         filter_rating = st.slider("Filter by Rating", 1, 5, (1, 5))
+        view_mode = st.radio("View as:", ["Table", "Cards"], horizontal=True)
         
-        filtered_books = st.session_state.library
-        if filter_genre != "All":
-            filtered_books = [book for book in filtered_books if filter_genre in book["genres"]]
-        if filter_status != "All":
-            filtered_books = [book for book in filtered_books if book["read_status"] == (filter_status == "Read")]
-        filtered_books = [book for book in filtered_books if filter_rating[0] <= book.get("rating", 0) <= filter_rating[1]]
+        # Reuse the last filter result so paging through cards does not filter the library again
+        filter_key = (filter_genre, filter_status, filter_rating)
+        if st.session_state.filter_cache and st.session_state.filter_cache[0] == filter_key:
+            filtered_books = st.session_state.filter_cache[1]
+        else:
+            # Status and rating are combined into one boolean mask over the library frame
+            df = library_frame()
+            if filter_genre != "All":
+                # Only the rows of books filed under the genre are looked at
+                df = df.iloc[sorted(st.session_state.indices["genre"].get(filter_genre, ()))]
+            mask = df["rating"].between(filter_rating[0], filter_rating[1])
+            if filter_status != "All":
+                mask &= df["read_status"] == (filter_status == "Read")
+            filtered_books = [st.session_state.library[i] for i in df.index[mask]]
+            st.session_state.filter_cache = (filter_key, filtered_books)
         
-        # Display filtered books
-        for book in filtered_books:
-            with st.container():
-                col1, col2 = st.columns([1, 3])
-                with col1:
-                    if book.get("cover_image"):
-                        st.image(book["cover_image"], width=100)
-                    else:
-                        st.image("https://via.placeholder.com/100x150?text=No+Cover", width=100)
-                with col2:
-                    st.subheader(book["title"])
-                    st.markdown(f"**Author:** {book['author']}")
-                    st.markdown(f"**Year:** {book['publication_year']}")
-                    st.markdown(f"**Genres:** {', '.join(book['genres'])}")
-                    st.markdown(f"**Status:** {'✅ Read' if book['read_status'] else '📖 Unread'}")
-                    st.markdown(f"**Rating:** {'⭐' * book.get('rating', 0)}")
-                    st.markdown(f"**Review:** {book.get('review', 'No review yet.')}")
-                    st.markdown(f"**Date Added:** {book['date_added']}")
-                st.markdown("---")
+        if not filtered_books:
+            st.info("No books match the selected filters.")
+        elif view_mode == "Cards":
+            # Only one page of cards is rendered per rerun
+            page_size = 25
+            page = st.number_input("Page", 1, max(1, math.ceil(len(filtered_books) / page_size)), 1)
+            start = (page - 1) * page_size
+            for book in filtered_books[start:start + page_size]:
+                show_book_card(book)
+        else:
+            # Display filtered books as one table instead of a block of widgets per book
+            df_view = pd.DataFrame({
+                "Title": [book["title"] for book in filtered_books],
+                "Author": [book["author"] for book in filtered_books],
+                "Year": [book["publication_year"] for book in filtered_books],
+                "Genres": [", ".join(book["genres"]) for book in filtered_books],
+                "Status": ["✅ Read" if book["read_status"] else "📖 Unread" for book in filtered_books],
+                "Rating": ["⭐" * book.get("rating", 0) for book in filtered_books]
+            })
+            st.dataframe(df_view, use_container_width=True, height=600)
+            
+            # Cover and review are only rendered for the selected book
+            picked = st.selectbox("Show details for:", df_view.index, format_func=lambda i: df_view["Title"][i])
+            show_book_card(filtered_books[picked])
 
-# Tab 3: Search Books
-with tab3:
+# Function to render the search tab; as a fragment, typing a query only reruns this tab
+@st.fragment
+def search_tab():
     st.header("Search for Books")
     
     search_by = st.radio("Search by:", ["title", "author", "genre"], horizontal=True)
     search_query = st.text_input(f"Enter {search_by} to search:", placeholder=f"Enter {search_by} to search")
     
-    if search_query:
+    # A query of only whitespace is treated as empty, so every searched query has words to look up
+    if search_query.strip():
         results = search_books(search_query, search_by)
         
         if results:
@@ -385,11 +690,15 @@ with tab3:
         else:
             st.info(f"No books found matching '{search_query}' in {search_by}.")
 
+# Tab 3: Search Books
+with tab3:
+    search_tab()
+
 # Tab 4: Statistics
 with tab4:
     st.header("Library Statistics")
     
-    stats = get_statistics()
+    stats, genre_df, year_df = get_statistics(library_key(), st.session_state.library, st.session_state.indices["genre"], library_frame())
     
     col1, col2, col3 = st.columns(3)
     
@@ -404,30 +713,10 @@ with tab4:
     
     if stats["total_books"] > 0:
         # Genre Distribution (Pie Chart)
-        genre_counts = {}
-        for book in st.session_state.library:
-            for genre in book["genres"]:
-                genre_counts[genre] = genre_counts.get(genre, 0) + 1
-        
-        genre_df = pd.DataFrame({
-            'Genre': list(genre_counts.keys()),
-            'Count': list(genre_counts.values())
-        })
-        
         fig = px.pie(genre_df, values='Count', names='Genre', title="Genre Distribution")
         st.plotly_chart(fig, use_container_width=True)
         
         # Publication Year Distribution (Bar Chart)
-        year_counts = {}
-        for book in st.session_state.library:
-            year = book["publication_year"]
-            year_counts[year] = year_counts.get(year, 0) + 1
-        
-        year_df = pd.DataFrame({
-            'Year': list(year_counts.keys()),
-            'Count': list(year_counts.values())
-        }).sort_values('Year')
-        
         fig = px.bar(year_df, x='Year', y='Count', title="Publication Year Distribution")
         st.plotly_chart(fig, use_container_width=True)
 
@@ -440,27 +729,17 @@ with tab5:
     col1, col2 = st.columns(2)
     
     with col1:
-        if st.button("Save Library to File"):
-            save_library()
+        if st.button("Save Library to File", help=f"Compacts {LIBRARY_LOG} into {LIBRARY_SNAPSHOT}"):
+            compact_library(force=True)
+        log_size = os.path.getsize(LIBRARY_LOG) if os.path.exists(LIBRARY_LOG) else 0
+        st.caption(f"{log_size / 1024:.1f} KB of changes logged since the last snapshot")
     
     with col2:
         if st.button("Load Library from File"):
-            if os.path.exists(LIBRARY_FILE):
-                try:
-                    with open(LIBRARY_FILE, 'r') as file:
-                        st.session_state.library = json.load(file)
-                    
-                    # Migration step: Ensure all books have the "genres" key
-                    for book in st.session_state.library:
-                        if "genres" not in book:
-                            book["genres"] = []  # Add "genres" key with an empty list as the default value
-                        book["genres"] = ["Sci-Fi" if genre == "Science Fiction" else genre for genre in book["genres"]]
-                    
-                    st.success(f"Library loaded successfully from {LIBRARY_FILE}")
-                except Exception as e:
-                    st.error(f"Error loading library: {e}")
+            if os.path.exists(LIBRARY_SNAPSHOT) or os.path.exists(LIBRARY_LOG):
+                load_library()
             else:
-                st.error(f"File {LIBRARY_FILE} does not exist.")
+                st.error(f"File {LIBRARY_SNAPSHOT} does not exist.")
     
     st.subheader("Export Library")
     export_format = st.selectbox("Export format:", ["CSV", "JSON", "Excel"])
@@ -469,52 +748,53 @@ with tab5:
         if not st.session_state.library:
             st.error("Library is empty. Nothing to export.")
         else:
+            export_books = [stored(book) for book in st.session_state.library]
             if export_format == "CSV":
-                df = pd.DataFrame(st.session_state.library)
-                csv = df.to_csv(index=False)
+                df = export_frame(export_books)
+                # Encode straight into a byte buffer rather than building the whole CSV as a str first
+                buf = io.BytesIO()
+                df.to_csv(buf, index=False, encoding="utf-8")
                 st.download_button(
                     label="Download CSV",
-                    data=csv,
+                    data=buf.getvalue(),
                     file_name="library_export.csv",
                     mime="text/csv"
                 )
             elif export_format == "JSON":
-                json_str = json.dumps(st.session_state.library, indent=4)
+                json_bytes = orjson.dumps(export_books, option=orjson.OPT_INDENT_2)
                 st.download_button(
                     label="Download JSON",
-                    data=json_str,
+                    data=json_bytes,
                     file_name="library_export.json",
                     mime="application/json"
                 )
             else:  # Excel
-                df = pd.DataFrame(st.session_state.library)
+                df = export_frame(export_books)
                 try:
-                    df.to_excel("library_export.xlsx", index=False)
-                    with open("library_export.xlsx", "rb") as file:
-                        st.download_button(
-                            label="Download Excel",
-                            data=file,
-                            file_name="library_export.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
+                    # Build the workbook in memory instead of round-tripping through a temporary file
+                    buf = io.BytesIO()
+                    with pd.ExcelWriter(buf, engine="xlsxwriter") as writer:
+                        df.to_excel(writer, index=False)
+                    st.download_button(
+                        label="Download Excel",
+                        data=buf.getvalue(),
+                        file_name="library_export.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
                 except Exception as e:
                     st.error(f"Error exporting to Excel: {e}")
-                finally:
-                    # Clean up temporary file if it exists
-                    if os.path.exists("library_export.xlsx"):
-                        os.remove("library_export.xlsx")
     
     # Remove specific books
     st.subheader("Remove a Book")
     if st.session_state.library:
-        book_to_remove = st.selectbox("Select a book to remove:", [book["title"] for book in st.session_state.library])
+        book_to_remove = st.selectbox("Select a book to remove:", library_titles(library_key(), st.session_state.library))
         if st.button("Remove Selected Book"):
-            if remove_book(book_to_remove):
+            if remove_book(st.session_state.title_to_index[book_to_remove]):
                 st.success(f"'{book_to_remove}' removed successfully!")
-            else:
-                st.error("Failed to remove the book.")
     else:
         st.info("No books in the library to remove.")
+    
+    maybe_save()
 
 # Tab 6: Edit Books
 with tab6:
@@ -524,9 +804,9 @@ with tab6:
         st.info("Your library is empty. Add some books to edit!")
     else:
         # Select book to edit
-        book_titles = [book["title"] for book in st.session_state.library]
+        book_titles = library_titles(library_key(), st.session_state.library)
         selected_title = st.selectbox("Select a book to edit:", book_titles)
-        book_index = book_titles.index(selected_title)
+        book_index = st.session_state.title_to_index[selected_title]
         book = st.session_state.library[book_index]
         
         # Form to edit book details
@@ -546,8 +826,7 @@ with tab6:
             with col2:
                 new_genres = st.multiselect(
                     "Genre",
-                    ["Fiction", "Action", "Adventure", "Comedy", "Horror", "Non-Fiction", "Sci-Fi", "Fantasy", "Mystery", "Thriller",
-                     "Romance", "Biography", "History", "Science", "Self-Help", "Other"],
+                    GENRES,
                     default=book["genres"]
                 )
                 new_read_status = st.checkbox("Have you read this book?", value=book["read_status"])
@@ -565,10 +844,5 @@ with tab6:
                     st.success(f"'{new_title}' by {new_author} updated successfully!")
             else:
                 st.error("Title, Author, and at least one Genre are required fields.")
-
-# Auto-save library when the app is closed
-def auto_save():
-    save_library()
-
-# Register the auto-save function to run when the app is closed
-st.session_state.on_close = auto_save
+    
+    maybe_save()